@@ -38,13 +38,16 @@ class NCNNManager(BaseBackendManager):
         if deploy_cfg:
             backend_config = get_backend_config(deploy_cfg)
             use_vulkan = backend_config.get('use_vulkan', False)
+            num_threads = backend_config.get('num_threads', None)
         else:
             use_vulkan = False
+            num_threads = None
         return NCNNWrapper(
             param_file=backend_files[0],
             bin_file=backend_files[1],
             output_names=output_names,
-            use_vulkan=use_vulkan)
+            use_vulkan=use_vulkan,
+            num_threads=num_threads)
 
     @classmethod
     def is_available(cls, with_custom_ops: bool = False) -> bool:
@@ -1,6 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import importlib
-from typing import Dict, Optional, Sequence
+from typing import Dict, List, Optional, Sequence
 
 import ncnn
 import numpy as np
@@ -21,6 +21,10 @@ class NCNNWrapper(BaseWrapper):
         output_names (Sequence[str] | None): Names of model outputs in order.
             Defaults to `None` and the wrapper will load the output names from
             ncnn model.
+        use_vulkan (bool): Whether to enable vulkan compute. Defaults to
+            `False`.
+        num_threads (int | None): Number of threads of the net. Defaults
+            to `None` and the ncnn default is kept.
 
     Examples:
         >>> from mmdeploy.backend.ncnn import NCNNWrapper
@@ -39,6 +43,7 @@ class NCNNWrapper(BaseWrapper):
                  bin_file: str,
                  output_names: Optional[Sequence[str]] = None,
                  use_vulkan: bool = False,
+                 num_threads: Optional[int] = None,
                  **kwargs):
 
         net = ncnn.Net()
@@ -46,6 +51,8 @@ class NCNNWrapper(BaseWrapper):
             from mmdeploy.backend.ncnn import ncnn_ext
             ncnn_ext.register_mmdeploy_custom_layers(net)
         net.opt.use_vulkan_compute = use_vulkan
+        if num_threads is not None:
+            net.opt.num_threads = num_threads
         net.load_param(param_file)
         net.load_model(bin_file)
 
@@ -83,64 +90,92 @@ class NCNNWrapper(BaseWrapper):
         if batch_size > 1:
             logger.warning(
                 f'ncnn only support batch_size = 1, but given {batch_size}')
-        for input_tensor in input_list[1:]:
+        for input_tensor in input_list:
             assert input_tensor.size(
                 0) == batch_size, 'All tensors should have same batch size'
             assert input_tensor.device.type == 'cpu', \
                 'ncnn only supports cpu device'
         # set output names
         output_names = self._output_names
-        # create output dict
-        outputs = dict([name, [None] * batch_size] for name in output_names)
+        # convert inputs to numpy once after validation, each image is then
+        # a view of the array. ncnn.Mat needs C-contiguous data, so permuted
+        # views are made contiguous here once instead of being copied
+        # implicitly for every image.
+        np_inputs = {}
+        for name, input_tensor in inputs.items():
+            input_tensor = input_tensor.detach()
+            if not input_tensor.is_contiguous():
+                input_tensor = input_tensor.contiguous()
+            np_inputs[name] = input_tensor.numpy()
         # run inference
-        for batch_id in range(batch_size):
-            # create extractor
-            ex = self._net.create_extractor()
-
-            # set inputs
-            for name, input_tensor in inputs.items():
-                data = input_tensor[batch_id].contiguous()
-                data = data.detach().cpu().numpy()
-                input_mat = ncnn.Mat(data)
-                ex.input(name, input_mat)
-
-            # get outputs
-            result = self.__ncnn_execute(
-                extractor=ex, output_names=output_names)
-            for name in output_names:
-                mat = result[name]
-                # deal with special case
-                if mat.empty():
-                    logger.warning(
-                        f'The "{name}" output of ncnn model is empty.')
-                    continue
-                outputs[name][batch_id] = torch.from_numpy(np.array(mat))
-
-        # stack outputs together
-        for name, output_tensor in outputs.items():
-            if None in output_tensor:
+        results = self.__ncnn_execute(inputs=np_inputs, batch_size=batch_size)
+        # stack the images of each output into a single allocation
+        outputs = {}
+        for name in output_names:
+            arrays = [result[name] for result in results]
+            # deal with special case
+            if any(array is None for array in arrays):
+                logger.warning(f'The "{name}" output of ncnn model is empty.')
                 outputs[name] = None
-            else:
-                outputs[name] = torch.stack(output_tensor)
+                continue
+            if batch_size == 1:
+                # the channels of a ncnn.Mat are aligned to `cstep`, only
+                # copy when that leaves gaps between the channels
+                outputs[name] = torch.from_numpy(
+                    np.ascontiguousarray(arrays[0])).unsqueeze(0)
+                continue
+            outputs[name] = torch.from_numpy(np.stack(arrays))
 
         return outputs
 
     @TimeCounter.count_time(Backend.NCNN.value)
-    def __ncnn_execute(self, extractor: ncnn.Extractor,
-                       output_names: Sequence[str]) -> Dict[str, ncnn.Mat]:
-        """Run inference with ncnn.
+    def __ncnn_execute(
+            self, inputs: Dict[str, np.ndarray],
+            batch_size: int) -> List[Dict[str, Optional[np.ndarray]]]:
+        """Run inference with ncnn on the whole batch.
+
+        Args:
+            inputs (Dict[str, np.ndarray]): Key-value pairs of contiguous
+                model inputs.
+            batch_size (int): The batch size of inputs.
+
+        Returns:
+            List[Dict[str, np.ndarray | None]]: Inference results of each
+                image.
+        """
+        return [
+            self._run_one(inputs, batch_id) for batch_id in range(batch_size)
+        ]
+
+    def _run_one(self, inputs: Dict[str, np.ndarray],
+                 batch_id: int) -> Dict[str, Optional[np.ndarray]]:
+        """Run inference on a single image of the batch.
 
         Args:
-            extractor (ncnn.Extractor): ncnn extractor to extract output.
-            output_names (Iterable[str]): A list of string specifying
-                output names.
+            inputs (Dict[str, np.ndarray]): Key-value pairs of contiguous
+                model inputs.
+            batch_id (int): Index of the image in the batch.
 
         Returns:
-            dict[str, ncnn.Mat]: Inference results of ncnn model.
+            Dict[str, np.ndarray | None]: Key-value pairs of model outputs,
+                `None` for empty outputs.
         """
+        # create extractor, light mode recycles intermediate blobs as soon as
+        # they are consumed. The thread count comes from the options of the
+        # net.
+        ex = self._net.create_extractor()
+        ex.set_light_mode(True)
+
+        # set inputs
+        for name, input_array in inputs.items():
+            input_mat = ncnn.Mat(input_array[batch_id])
+            ex.input(name, input_mat)
+
+        # get outputs, `np.asarray` shares the buffer of ncnn.Mat and keeps
+        # its channel padding, `forward` compacts the arrays
         result = {}
-        for name in output_names:
-            out_ret, out = extractor.extract(name)
+        for name in self._output_names:
+            out_ret, out = ex.extract(name)
             assert out_ret == 0, f'Failed to extract output : {out}.'
-            result[name] = out
+            result[name] = None if out.empty() else np.asarray(out)
         return result
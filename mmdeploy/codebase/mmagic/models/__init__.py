@@ -1,2 +1,3 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 from . import base_models  # noqa F401, F403
+from . import editors  # noqa F401, F403
@@ -0,0 +1,105 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import math
+
+import torch
+from torch import nn
+
+from mmdeploy.core import MODULE_REWRITER
+from mmdeploy.utils import get_codebase_config
+
+
+def _cubic_kernel_1d(scale: int, a: float = -0.75) -> torch.Tensor:
+    """Get the 1D transposed convolution kernel of bicubic upsampling.
+
+    The weights follow `torch.nn.Upsample(mode='bicubic',
+    align_corners=False)`, output pixel `j` samples the input at
+    `(j + 0.5) / scale - 0.5`.
+
+    Args:
+        scale (int): The upsampling factor.
+        a (float): The coefficient of the cubic convolution kernel, -0.75
+            is the value used by PyTorch. Defaults to -0.75.
+
+    Returns:
+        torch.Tensor: The kernel of shape (2 * pad + scale, ).
+    """
+
+    def cubic(x):
+        x = abs(x)
+        if x <= 1:
+            return ((a + 2) * x - (a + 3)) * x * x + 1
+        if x < 2:
+            return ((a * x - 5 * a) * x + 8 * a) * x - 4 * a
+        return 0.
+
+    pad = _cubic_padding(scale)
+    kernel_size = 2 * pad + scale
+    return torch.tensor([
+        cubic((k - pad + 0.5) / scale - 0.5) for k in range(kernel_size)
+    ])
+
+
+def _cubic_padding(scale: int) -> int:
+    """Get the padding of the transposed convolution kernel so that it
+    covers the 4-tap support of the cubic kernel."""
+    return math.ceil(1.5 * scale + 0.5) - 1
+
+
+@MODULE_REWRITER.register_rewrite_module(
+    'mmagic.models.editors.srcnn.SRCNNNet', backend='tensorrt')
+class SRCNNNet__tensorrt(nn.Module):
+    """Rewrite the bicubic upsampler of `SRCNNNet` for TensorRT.
+
+    The upsampling factor is fixed at export time, so bicubic upsampling
+    is implemented as a depthwise `ConvTranspose2d` with frozen weights,
+    which runs as a native deconvolution layer in TensorRT instead of a
+    cubic `Resize`. The input is replicate padded first so that borders
+    match the index clamping of bicubic upsampling, the output is the same
+    as the original upsampler.
+
+    The upsampler is selected by `codebase_config.upsample_mode`:
+    `'bicubic'` (default) keeps the original upsampler, `'deconv'` and
+    `'bilinear'` are opt-in.
+    """
+
+    def __init__(self, module, deploy_cfg, **kwargs):
+        super(SRCNNNet__tensorrt, self).__init__()
+        self._module = module
+        self.deploy_cfg = deploy_cfg
+
+        codebase_cfg = get_codebase_config(deploy_cfg)
+        upsample_mode = codebase_cfg.get('upsample_mode', 'bicubic')
+        scale = module.upscale_factor
+        if upsample_mode == 'deconv':
+            channels = module.conv1.in_channels
+            pad = _cubic_padding(scale)
+            kernel_1d = _cubic_kernel_1d(scale)
+            kernel_size = kernel_1d.numel()
+            upsampler = nn.ConvTranspose2d(
+                channels,
+                channels,
+                kernel_size=kernel_size,
+                stride=scale,
+                padding=pad + 2 * scale,
+                groups=channels,
+                bias=False)
+            weight = torch.outer(kernel_1d, kernel_1d)
+            weight = weight.expand(channels, 1, kernel_size, kernel_size)
+            upsampler.weight.data.copy_(weight)
+            upsampler.requires_grad_(False)
+            module.img_upsampler = nn.Sequential(
+                nn.ReplicationPad2d(2), upsampler)
+        elif upsample_mode == 'bilinear':
+            module.img_upsampler = nn.Upsample(
+                scale_factor=scale, mode='bilinear', align_corners=False)
+        else:
+            assert upsample_mode == 'bicubic', \
+                f'Unsupported upsample_mode: {upsample_mode}'
+
+    def forward(self, *args, **kwargs):
+        """Run forward."""
+        return self._module(*args, **kwargs)
+
+    def init_weights(self, *args, **kwargs):
+        """Initialize weights."""
+        return self._module.init_weights(*args, **kwargs)
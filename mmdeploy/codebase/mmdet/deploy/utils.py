@@ -189,9 +189,9 @@ def __gather_topk(*inputs: Sequence[torch.Tensor],
                   is_batched: bool = True) -> Tuple[torch.Tensor]:
     """The default implementation of gather_topk."""
     if is_batched:
-        batch_inds = torch.arange(batch_size, device=inds.device).unsqueeze(-1)
         outputs = [
-            x[batch_inds, inds, ...] if x is not None else None for x in inputs
+            _gather_along_dim1(x, inds) if x is not None else None
+            for x in inputs
         ]
     else:
         prior_inds = inds.new_zeros((1, 1))
@@ -202,6 +202,22 @@ def __gather_topk(*inputs: Sequence[torch.Tensor],
     return outputs
 
 
+def _gather_along_dim1(x: torch.Tensor, inds: torch.Tensor) -> torch.Tensor:
+    """Gather a batched tensor along dim 1 with `torch.gather`.
+
+    Args:
+        x (torch.Tensor): Tensor of shape (N, num_priors, ...).
+        inds (torch.Tensor): Index of shape (N, k).
+
+    Returns:
+        torch.Tensor: Gathered tensor of shape (N, k, ...).
+    """
+    trailing_shape = x.shape[2:]
+    inds = inds.reshape(*inds.shape, *([1] * len(trailing_shape)))
+    inds = inds.expand(*inds.shape[:2], *trailing_shape)
+    return torch.gather(x, 1, inds)
+
+
 class TRTGatherTopk(torch.autograd.Function):
 
     @staticmethod
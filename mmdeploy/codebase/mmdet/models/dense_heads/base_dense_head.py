@@ -80,17 +80,12 @@ def base_dense_head__predict_by_feat(
 
     mlvl_priors = [priors.unsqueeze(0) for priors in mlvl_priors]
 
-    mlvl_cls_scores = [cls_scores[i].detach() for i in range(num_levels)]
-    mlvl_bbox_preds = [bbox_preds[i].detach() for i in range(num_levels)]
-
     if score_factors is None:
         with_score_factors = False
         mlvl_score_factor = [None for _ in range(num_levels)]
     else:
         with_score_factors = True
-        mlvl_score_factor = [
-            score_factors[i].detach() for i in range(num_levels)
-        ]
+        mlvl_score_factor = score_factors
         mlvl_score_factors = []
     assert batch_img_metas is not None
     img_shape = batch_img_metas[0]['img_shape']
@@ -99,55 +94,63 @@ def base_dense_head__predict_by_feat(
     batch_size = cls_scores[0].shape[0]
     cfg = self.test_cfg
     pre_topk = cfg.get('nms_pre', -1)
+    # Scores are only activated per level when they are needed for the
+    # top-k selection. Sigmoid is monotonic, so without score factors the
+    # top-k is selected on logits and the selected scores of all levels are
+    # activated at once after concatenation.
+    activate_per_level = pre_topk > 0 and (with_score_factors
+                                           or not self.use_sigmoid_cls)
+    # The score factors are multiplied into the scores used for the top-k
+    # selection, the product is kept instead of concatenating the factors.
+    fold_score_factors = with_score_factors and pre_topk > 0
 
     mlvl_valid_bboxes = []
     mlvl_valid_scores = []
     mlvl_valid_priors = []
 
     for cls_score, bbox_pred, score_factors, priors in zip(
-            mlvl_cls_scores, mlvl_bbox_preds, mlvl_score_factor, mlvl_priors):
+            cls_scores, bbox_preds, mlvl_score_factor, mlvl_priors):
         assert cls_score.size()[-2:] == bbox_pred.size()[-2:]
 
-        scores = cls_score.permute(0, 2, 3, 1).reshape(batch_size, -1,
-                                                       self.cls_out_channels)
-        if self.use_sigmoid_cls:
-            scores = scores.sigmoid()
-        else:
-            scores = scores.softmax(-1)[:, :, :-1]
+        scores = cls_score.detach().permute(0, 2, 3, 1).reshape(
+            batch_size, -1, self.cls_out_channels)
+        if activate_per_level:
+            scores = _activate_cls_scores(scores, self.use_sigmoid_cls)
         if with_score_factors:
-            score_factors = score_factors.permute(0, 2, 3,
-                                                  1).reshape(batch_size,
-                                                             -1).sigmoid()
+            score_factors = score_factors.detach().permute(
+                0, 2, 3, 1).reshape(batch_size, -1).sigmoid()
             score_factors = score_factors.unsqueeze(2)
         dim = self.bbox_coder.encode_size
-        bbox_pred = bbox_pred.permute(0, 2, 3, 1).reshape(batch_size, -1, dim)
+        bbox_pred = bbox_pred.detach().permute(0, 2, 3,
+                                               1).reshape(batch_size, -1, dim)
         if not is_dynamic_flag:
             priors = priors.data
 
         if pre_topk > 0:
             priors = pad_with_value_if_necessary(priors, 1, pre_topk)
             bbox_pred = pad_with_value_if_necessary(bbox_pred, 1, pre_topk)
-            scores = pad_with_value_if_necessary(scores, 1, pre_topk, 0.)
+            # padded logits must be activated to zero
+            pad_score = 0. if activate_per_level else -float('inf')
+            scores = pad_with_value_if_necessary(scores, 1, pre_topk,
+                                                 pad_score)
             if with_score_factors:
                 score_factors = pad_with_value_if_necessary(
                     score_factors, 1, pre_topk, 0.)
 
-            nms_pre_score = scores
-            if with_score_factors:
-                nms_pre_score = nms_pre_score * score_factors
+            if fold_score_factors:
+                scores = scores * score_factors
                 if isinstance(self, PAAHead):
-                    nms_pre_score = nms_pre_score.sqrt()
+                    scores = scores.sqrt()
 
             # Get maximum scores for foreground classes.
             if self.use_sigmoid_cls:
-                max_scores, _ = nms_pre_score.max(-1)
+                max_scores, _ = scores.max(-1)
             else:
-                max_scores, _ = nms_pre_score[..., :-1].max(-1)
+                max_scores, _ = scores[..., :-1].max(-1)
             _, topk_inds = max_scores.topk(pre_topk)
-            bbox_pred, scores, score_factors = gather_topk(
+            bbox_pred, scores = gather_topk(
                 bbox_pred,
                 scores,
-                score_factors,
                 inds=topk_inds,
                 batch_size=batch_size,
                 is_batched=True)
@@ -160,39 +163,69 @@ def base_dense_head__predict_by_feat(
         mlvl_valid_bboxes.append(bbox_pred)
         mlvl_valid_scores.append(scores)
         mlvl_valid_priors.append(priors)
-        if with_score_factors:
+        if with_score_factors and not fold_score_factors:
             mlvl_score_factors.append(score_factors)
 
     batch_mlvl_bboxes_pred = torch.cat(mlvl_valid_bboxes, dim=1)
     batch_scores = torch.cat(mlvl_valid_scores, dim=1)
     batch_priors = torch.cat(mlvl_valid_priors, dim=1)
+    if not activate_per_level:
+        batch_scores = _activate_cls_scores(batch_scores,
+                                            self.use_sigmoid_cls)
 
-    if issubclass(prior_type, BaseBoxes):
-        batch_priors = prior_type(batch_priors, clone=False)
-
-    batch_bboxes = self.bbox_coder.decode(
-        batch_priors, batch_mlvl_bboxes_pred, max_shape=img_shape)
-
-    batch_bboxes = get_box_tensor(batch_bboxes)
-
-    if with_score_factors:
+    if with_score_factors and not fold_score_factors:
         batch_score_factors = torch.cat(mlvl_score_factors, dim=1)
     if not self.use_sigmoid_cls:
         batch_scores = batch_scores[..., :self.num_classes]
 
-    if with_score_factors:
+    if with_score_factors and not fold_score_factors:
         batch_scores = batch_scores * batch_score_factors
         if isinstance(self, PAAHead):
             batch_scores = batch_scores.sqrt()
 
+    if with_nms:
+        post_params = get_post_processing_params(deploy_cfg)
+        score_threshold = cfg.get('score_thr', post_params.score_threshold)
+        pre_top_k = post_params.pre_top_k
+        # Only decode the boxes that can pass the score threshold of nms.
+        # Every image keeps the same number of boxes, the extra ones are
+        # below the threshold and dropped by nms. The number of boxes is
+        # dynamic, so this is disabled by default.
+        if post_params.get('filter_before_decode', False):
+            max_scores, _ = batch_scores.max(-1)
+            num_keep = (max_scores > score_threshold).sum(-1).max().clamp(
+                min=1)
+            # the kept boxes are already the top-k of nms, which would fail
+            # on fewer boxes than `pre_top_k`
+            if pre_top_k > 0:
+                num_keep = num_keep.clamp(max=pre_top_k)
+                pre_top_k = -1
+            _, keep_inds = max_scores.topk(num_keep)
+            batch_mlvl_bboxes_pred, batch_scores = gather_topk(
+                batch_mlvl_bboxes_pred,
+                batch_scores,
+                inds=keep_inds,
+                batch_size=batch_size,
+                is_batched=True)
+            batch_priors = gather_topk(
+                batch_priors,
+                inds=keep_inds,
+                batch_size=batch_size,
+                is_batched=pre_topk > 0)
+
+    if issubclass(prior_type, BaseBoxes):
+        batch_priors = prior_type(batch_priors, clone=False)
+
+    batch_bboxes = self.bbox_coder.decode(
+        batch_priors, batch_mlvl_bboxes_pred, max_shape=img_shape)
+
+    batch_bboxes = get_box_tensor(batch_bboxes)
+
     if not with_nms:
         return batch_bboxes, batch_scores
 
-    post_params = get_post_processing_params(deploy_cfg)
     max_output_boxes_per_class = post_params.max_output_boxes_per_class
     iou_threshold = cfg.nms.get('iou_threshold', post_params.iou_threshold)
-    score_threshold = cfg.get('score_thr', post_params.score_threshold)
-    pre_top_k = post_params.pre_top_k
     keep_top_k = cfg.get('max_per_img', post_params.keep_top_k)
     nms_type = cfg.nms.get('type')
     return multiclass_nms(
@@ -422,17 +455,21 @@ def base_dense_head__predict_by_feat__ncnn(
     else:
         vars = torch.tensor([1, 1, 1, 1], dtype=torch.float32)
 
-    if isinstance(batch_img_metas[0]['img_shape'][0], int):
-        assert isinstance(batch_img_metas[0]['img_shape'][1], int)
-        img_height = batch_img_metas[0]['img_shape'][0]
-        img_width = batch_img_metas[0]['img_shape'][1]
+    img_shape = batch_img_metas[0]['img_shape']
+    if isinstance(img_shape[0], int):
+        assert isinstance(img_shape[1], int)
+        img_height = img_shape[0]
+        img_width = img_shape[1]
     else:
-        img_height = batch_img_metas[0]['img_shape'][0].item()
-        img_width = batch_img_metas[0]['img_shape'][1].item()
-    featmap_sizes = [cls_scores[i].shape[-2:] for i in range(num_levels)]
+        img_height = img_shape[0].item()
+        img_width = img_shape[1].item()
+    # Shapes are static for ncnn, use python ints so that they are traced
+    # as constants.
+    featmap_sizes = [(int(cls_score.shape[-2]), int(cls_score.shape[-1]))
+                     for cls_score in cls_scores]
     mlvl_priors = self.prior_generator.grid_priors(
         featmap_sizes, device=cls_scores[0].device)
-    batch_mlvl_priors = []
+    normalized_priors = []
     for i in range(num_levels):
         _priors = mlvl_priors[i].reshape(1, -1, mlvl_priors[i].shape[-1])
         x1 = _priors[:, :, 0:1] / img_width
@@ -440,7 +477,8 @@ def base_dense_head__predict_by_feat__ncnn(
         x2 = _priors[:, :, 2:3] / img_width
         y2 = _priors[:, :, 3:4] / img_height
         priors = torch.cat([x1, y1, x2, y2], dim=2).data
-        batch_mlvl_priors.append(priors)
+        normalized_priors.append(priors)
+    batch_mlvl_priors = torch.cat(normalized_priors, dim=1)
 
     cfg = self.test_cfg if cfg is None else cfg
 
@@ -448,9 +486,8 @@ def base_dense_head__predict_by_feat__ncnn(
     batch_mlvl_scores = []
     batch_mlvl_score_factors = []
 
-    for level_idx, (cls_score, bbox_pred, score_factor, priors) in \
-            enumerate(zip(cls_scores, bbox_preds,
-                      score_factor_list, batch_mlvl_priors)):
+    for cls_score, bbox_pred, score_factor in zip(cls_scores, bbox_preds,
+                                                  score_factor_list):
         assert cls_score.size()[-2:] == bbox_pred.size()[-2:]
         # ncnn needs 3 dimensions to reshape when including -1 parameter in
         # width or height dimension.
@@ -460,28 +497,31 @@ def base_dense_head__predict_by_feat__ncnn(
                 reshape(batch_size, -1, 1).sigmoid()
         cls_score = cls_score.permute(0, 2, 3, 1).\
             reshape(batch_size, -1, self.cls_out_channels)
-        # ncnn DetectionOutput op needs num_class + 1 classes. So if sigmoid
-        # score, we should padding background class according to mmdetection
-        # num_class definition.
-        if self.use_sigmoid_cls:
-            scores = cls_score.sigmoid()
-            dummy_background_score = torch.zeros(
-                batch_size, cls_score.shape[1], 1, device=cls_score.device)
-            scores = torch.cat([scores, dummy_background_score], dim=2)
-        else:
-            scores = cls_score.softmax(-1)
         batch_mlvl_bboxes.append(bbox_pred)
-        batch_mlvl_scores.append(scores)
+        batch_mlvl_scores.append(cls_score)
         batch_mlvl_score_factors.append(score_factor)
 
-    batch_mlvl_priors = torch.cat(batch_mlvl_priors, dim=1)
     batch_mlvl_scores = torch.cat(batch_mlvl_scores, dim=1)
+    # ncnn DetectionOutput op needs num_class + 1 classes with background
+    # first. So if sigmoid score, we should padding background class in
+    # front according to mmdetection num_class definition.
+    if self.use_sigmoid_cls:
+        batch_mlvl_scores = batch_mlvl_scores.sigmoid()
+        dummy_background_score = torch.zeros(
+            batch_size,
+            batch_mlvl_scores.shape[1],
+            1,
+            device=batch_mlvl_scores.device)
+        batch_mlvl_scores = torch.cat(
+            [dummy_background_score, batch_mlvl_scores], dim=2)
+    else:
+        batch_mlvl_scores = batch_mlvl_scores.softmax(-1)
+        batch_mlvl_scores = torch.cat([
+            batch_mlvl_scores[:, :, self.num_classes:],
+            batch_mlvl_scores[:, :, 0:self.num_classes]
+        ],
+                                      dim=2)
     batch_mlvl_bboxes = torch.cat(batch_mlvl_bboxes, dim=1)
-    batch_mlvl_scores = torch.cat([
-        batch_mlvl_scores[:, :, self.num_classes:],
-        batch_mlvl_scores[:, :, 0:self.num_classes]
-    ],
-                                  dim=2)
     if isinstance(self.bbox_coder, TBLRBBoxCoder):
         batch_mlvl_bboxes = _tblr_pred_to_delta_xywh_pred(
             batch_mlvl_bboxes, vars[0:2])
@@ -528,6 +568,24 @@ def base_dense_head__predict_by_feat__ncnn(
     return output__ncnn
 
 
+def _activate_cls_scores(scores: Tensor, use_sigmoid_cls: bool) -> Tensor:
+    """Apply sigmoid or softmax to classification scores.
+
+    Args:
+        scores (Tensor): The classification scores, has shape
+            (N, num_priors, cls_out_channels).
+        use_sigmoid_cls (bool): Whether to use sigmoid instead of softmax.
+
+    Returns:
+        Tensor: The activated scores. With softmax the last column is the
+            background class and is dropped, so the result has
+            cls_out_channels - 1 channels.
+    """
+    if use_sigmoid_cls:
+        return scores.sigmoid()
+    return scores.softmax(-1)[:, :, :-1]
+
+
 def _tblr_pred_to_delta_xywh_pred(bbox_pred: torch.Tensor,
                                   normalizer: torch.Tensor) -> torch.Tensor:
     """Transform tblr format bbox prediction to delta_xywh format for ncnn.
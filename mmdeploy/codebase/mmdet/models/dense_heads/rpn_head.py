@@ -65,15 +65,14 @@ def rpn_head__predict_by_feat(self,
     assert len(cls_scores) == len(bbox_preds)
     deploy_cfg = ctx.cfg
     is_dynamic_flag = is_dynamic_shape(deploy_cfg)
-    num_levels = len(cls_scores)
 
     device = cls_scores[0].device
-    featmap_sizes = [cls_scores[i].shape[-2:] for i in range(num_levels)]
+    mlvl_cls_scores = [cls_score.detach() for cls_score in cls_scores]
+    mlvl_bbox_preds = [bbox_pred.detach() for bbox_pred in bbox_preds]
+    featmap_sizes = [cls_score.shape[-2:] for cls_score in mlvl_cls_scores]
     mlvl_anchors = self.anchor_generator.grid_anchors(
         featmap_sizes, device=device)
 
-    mlvl_cls_scores = [cls_scores[i].detach() for i in range(num_levels)]
-    mlvl_bbox_preds = [bbox_preds[i].detach() for i in range(num_levels)]
     assert len(mlvl_cls_scores) == len(mlvl_bbox_preds) == len(mlvl_anchors)
 
     cfg = self.test_cfg if cfg is None else cfg
@@ -84,8 +83,8 @@ def rpn_head__predict_by_feat(self,
     mlvl_valid_bboxes = []
     mlvl_scores = []
     mlvl_valid_anchors = []
-    for level_id, cls_score, bbox_pred, anchors in zip(
-            range(num_levels), mlvl_cls_scores, mlvl_bbox_preds, mlvl_anchors):
+    for cls_score, bbox_pred, anchors in zip(mlvl_cls_scores, mlvl_bbox_preds,
+                                             mlvl_anchors):
         assert cls_score.size()[-2:] == bbox_pred.size()[-2:]
         cls_score = cls_score.permute(0, 2, 3, 1)
         if self.use_sigmoid_cls:
@@ -106,13 +105,12 @@ def rpn_head__predict_by_feat(self,
         if not is_dynamic_flag:
             anchors = anchors.data
 
-        anchors = anchors.unsqueeze(0)
-
         # topk in tensorrt does not support shape<k
         # concate zero to enable topk,
         scores = pad_with_value_if_necessary(scores, 1, pre_topk, 0.)
         bbox_pred = pad_with_value_if_necessary(bbox_pred, 1, pre_topk)
-        anchors = pad_with_value_if_necessary(anchors, 1, pre_topk)
+        anchors = pad_with_value_if_necessary(anchors, 0, pre_topk)
+        anchors = anchors.unsqueeze(0)
 
         if pre_topk > 0:
             _, topk_inds = scores.squeeze(2).topk(pre_topk)
@@ -134,10 +132,9 @@ def rpn_head__predict_by_feat(self,
     batch_mlvl_bboxes = torch.cat(mlvl_valid_bboxes, dim=1)
     batch_mlvl_scores = torch.cat(mlvl_scores, dim=1)
     batch_mlvl_anchors = torch.cat(mlvl_valid_anchors, dim=1)
+    img_shape = img_metas[0]['img_shape']
     batch_mlvl_bboxes = self.bbox_coder.decode(
-        batch_mlvl_anchors,
-        batch_mlvl_bboxes,
-        max_shape=img_metas[0]['img_shape'])
+        batch_mlvl_anchors, batch_mlvl_bboxes, max_shape=img_shape)
     # ignore background class
     if not self.use_sigmoid_cls:
         batch_mlvl_scores = batch_mlvl_scores[..., :self.num_classes]
@@ -207,15 +204,17 @@ def rpn_head__get_bboxes__ncnn(self,
     assert len(cls_scores) == len(bbox_preds)
     deploy_cfg = ctx.cfg
     assert not is_dynamic_shape(deploy_cfg)
-    num_levels = len(cls_scores)
 
     device = cls_scores[0].device
-    featmap_sizes = [cls_scores[i].shape[-2:] for i in range(num_levels)]
+    mlvl_cls_scores = [cls_score.detach() for cls_score in cls_scores]
+    mlvl_bbox_preds = [bbox_pred.detach() for bbox_pred in bbox_preds]
+    # shapes are static, use python ints so that they are traced as
+    # constants
+    featmap_sizes = [(int(cls_score.shape[-2]), int(cls_score.shape[-1]))
+                     for cls_score in mlvl_cls_scores]
     mlvl_anchors = self.anchor_generator.grid_anchors(
         featmap_sizes, device=device)
 
-    mlvl_cls_scores = [cls_scores[i].detach() for i in range(num_levels)]
-    mlvl_bbox_preds = [bbox_preds[i].detach() for i in range(num_levels)]
     assert len(mlvl_cls_scores) == len(mlvl_bbox_preds) == len(mlvl_anchors)
 
     cfg = self.test_cfg if cfg is None else cfg
@@ -226,8 +225,8 @@ def rpn_head__get_bboxes__ncnn(self,
     mlvl_valid_bboxes = []
     mlvl_scores = []
     mlvl_valid_anchors = []
-    for level_id, cls_score, bbox_pred, anchors in zip(
-            range(num_levels), mlvl_cls_scores, mlvl_bbox_preds, mlvl_anchors):
+    for cls_score, bbox_pred, anchors in zip(mlvl_cls_scores, mlvl_bbox_preds,
+                                             mlvl_anchors):
         assert cls_score.size()[-2:] == bbox_pred.size()[-2:]
         cls_score = cls_score.permute(0, 2, 3, 1)
         if self.use_sigmoid_cls:
@@ -243,14 +242,16 @@ def rpn_head__get_bboxes__ncnn(self,
         scores = scores.reshape(batch_size, -1, 1)
         dim = self.bbox_coder.encode_size
         bbox_pred = bbox_pred.permute(0, 2, 3, 1).reshape(batch_size, -1, dim)
-        anchors = anchors.expand_as(bbox_pred).data
+        anchors = anchors.data
 
         if pre_topk > 0:
             _, topk_inds = scores.squeeze(2).topk(pre_topk)
             topk_inds = topk_inds.view(-1)
-            anchors = anchors[:, topk_inds, :]
+            anchors = anchors[topk_inds, :]
             bbox_pred = bbox_pred[:, topk_inds, :]
             scores = scores[:, topk_inds, :]
+        # select from the compact anchor table before expanding to batch
+        anchors = anchors.unsqueeze(0).expand(batch_size, -1, -1)
 
         mlvl_valid_bboxes.append(bbox_pred)
         mlvl_scores.append(scores)
@@ -259,10 +260,9 @@ def rpn_head__get_bboxes__ncnn(self,
     batch_mlvl_bboxes = torch.cat(mlvl_valid_bboxes, dim=1)
     batch_mlvl_scores = torch.cat(mlvl_scores, dim=1)
     batch_mlvl_anchors = torch.cat(mlvl_valid_anchors, dim=1)
+    img_shape = img_metas[0]['img_shape']
     batch_mlvl_bboxes = self.bbox_coder.decode(
-        batch_mlvl_anchors,
-        batch_mlvl_bboxes,
-        max_shape=img_metas[0]['img_shape'])
+        batch_mlvl_anchors, batch_mlvl_bboxes, max_shape=img_shape)
     # ignore background class
     if not self.use_sigmoid_cls:
         batch_mlvl_scores = batch_mlvl_scores[..., :self.num_classes]
@@ -48,30 +48,30 @@ class TimeCounter:
                 enable=False)
 
             def fun(*args, **kwargs):
-                count = cls.names[name]['count']
-                execute_time = cls.names[name]['execute_time']
-                log_interval = cls.names[name]['log_interval']
-                warmup = cls.names[name]['warmup']
-                with_sync = cls.names[name]['with_sync']
-                batch_size = cls.names[name]['batch_size']
-                enable = cls.names[name]['enable']
-
-                count += 1
-                cls.names[name]['count'] = count
-
-                if enable:
-                    if with_sync and torch.cuda.is_available():
-                        torch.cuda.synchronize()
-                    start_time = time.perf_counter()
+                stats = cls.names[name]
+                stats['count'] += 1
+                # skip the bookkeeping when the timer is not activated
+                if not stats['enable']:
+                    return func(*args, **kwargs)
+
+                count = stats['count']
+                execute_time = stats['execute_time']
+                log_interval = stats['log_interval']
+                warmup = stats['warmup']
+                with_sync = stats['with_sync']
+                batch_size = stats['batch_size']
+
+                if with_sync and torch.cuda.is_available():
+                    torch.cuda.synchronize()
+                start_time = time.perf_counter()
 
                 result = func(*args, **kwargs)
 
-                if enable:
-                    if with_sync and torch.cuda.is_available():
-                        torch.cuda.synchronize()
-                    elapsed = (time.perf_counter() - start_time) / batch_size
+                if with_sync and torch.cuda.is_available():
+                    torch.cuda.synchronize()
+                elapsed = (time.perf_counter() - start_time) / batch_size
 
-                if enable and count > warmup:
+                if count > warmup:
                     execute_time.append(elapsed)
 
                     if (count - warmup) % log_interval == 0:
@@ -1,4 +1,5 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import copy
 import os.path as osp
 import tempfile
 from typing import Dict, List, Optional
@@ -9,7 +10,7 @@ import pytest
 import torch
 
 from mmdeploy.codebase import import_codebase
-from mmdeploy.core import RewriterContext
+from mmdeploy.core import RewriterContext, patch_model
 from mmdeploy.utils import Backend, Codebase, get_onnx_config
 
 try:
@@ -122,3 +123,20 @@ def test_srcnn():
         onnx.checker.check_model(model)
     except onnx.checker.ValidationError:
         assert False
+
+
+@pytest.mark.parametrize('upscale_factor', [2, 3, 4])
+def test_srcnn__tensorrt_deconv_upsampler(upscale_factor):
+    from mmagic.models.editors.srcnn import SRCNNNet
+
+    deconv_cfg = copy.deepcopy(deploy_cfg)
+    deconv_cfg.codebase_config.upsample_mode = 'deconv'
+    pytorch_model = SRCNNNet(upscale_factor=upscale_factor).eval()
+    with torch.no_grad():
+        expected = pytorch_model.img_upsampler(img)
+        patched_model = patch_model(
+            pytorch_model, cfg=deconv_cfg, backend=Backend.TENSORRT.value)
+        output = patched_model._module.img_upsampler(img)
+
+    assert output.shape == expected.shape
+    torch.testing.assert_allclose(output, expected, rtol=1e-4, atol=1e-5)
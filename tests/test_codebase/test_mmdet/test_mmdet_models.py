@@ -1674,6 +1674,64 @@ def test_base_dense_head_predict_by_feat(backend_type: Backend, ir_type: str):
         assert rewrite_outputs is not None
 
 
+@pytest.mark.parametrize('pre_top_k', [-1, 10, 5000])
+def test_base_dense_head_predict_by_feat_filter_before_decode(pre_top_k: int):
+    """Test that filtering before decode keeps the detections unchanged."""
+    backend_type = Backend.ONNXRUNTIME
+    check_backend(backend_type)
+    anchor_head = get_anchor_head_model()
+    anchor_head.cpu().eval()
+    s = 128
+    batch_img_metas = [{
+        'scale_factor': np.ones(4),
+        'pad_shape': (s, s, 3),
+        'img_shape': torch.Tensor([s, s])
+    } for _ in range(2)]
+
+    # most logits are far below the score threshold after sigmoid, only a
+    # few boxes pass and the two images keep a different number of them.
+    # 20 boxes pass in the second image, more than a `pre_top_k` of 10 and
+    # fewer than one of 5000.
+    seed_everything(1234)
+    cls_score = [
+        torch.rand(2, 36, pow(2, i), pow(2, i)) - 10 for i in range(5, 0, -1)
+    ]
+    cls_score[0][0, 0, :2, :2] = 5 + torch.rand(2, 2)
+    cls_score[0][1, 0, :4, :4] = 5 + torch.rand(4, 4)
+    cls_score[2][1, 9, :2, :2] = 5 + torch.rand(2, 2)
+    seed_everything(5678)
+    bboxes = [torch.rand(2, 36, pow(2, i), pow(2, i)) for i in range(5, 0, -1)]
+
+    wrapped_model = WrapModel(
+        anchor_head, 'predict_by_feat', batch_img_metas=batch_img_metas)
+    rewrite_inputs = {
+        'cls_scores': cls_score,
+        'bbox_preds': bboxes,
+    }
+
+    outputs = []
+    for filter_before_decode in (False, True):
+        deploy_cfg = get_deploy_cfg(backend_type, 'onnx')
+        deploy_cfg.codebase_config.post_processing.filter_before_decode = \
+            filter_before_decode
+        deploy_cfg.codebase_config.post_processing.pre_top_k = pre_top_k
+        rewrite_outputs, _ = get_rewrite_outputs(
+            wrapped_model=wrapped_model,
+            model_inputs=rewrite_inputs,
+            deploy_cfg=deploy_cfg)
+        outputs.append(rewrite_outputs)
+
+    (dets, labels), (filtered_dets, filtered_labels) = outputs
+    for i in range(2):
+        keep = dets[i, :, 4] > 0.05
+        filtered_keep = filtered_dets[i, :, 4] > 0.05
+        assert keep.sum() > 0
+        assert keep.sum() == filtered_keep.sum()
+        assert np.allclose(
+            dets[i][keep], filtered_dets[i][filtered_keep], atol=1e-05)
+        assert np.allclose(labels[i][keep], filtered_labels[i][filtered_keep])
+
+
 def test_base_dense_head_predict_by_feat__ncnn():
     """Test predict_by_feat rewrite of base dense head."""
     backend_type = Backend.NCNN
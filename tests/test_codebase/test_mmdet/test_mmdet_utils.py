@@ -12,7 +12,7 @@ try:
 except ImportError:
     pytest.skip(f'{Codebase.MMDET} is not installed.', allow_module_level=True)
 
-from mmdeploy.codebase.mmdet.deploy import (clip_bboxes,
+from mmdeploy.codebase.mmdet.deploy import (clip_bboxes, gather_topk,
                                             get_post_processing_params,
                                             pad_with_value,
                                             pad_with_value_if_necessary)
@@ -45,6 +45,15 @@ def test_pad_with_value_if_necessary():
     assert np.allclose(padded_x.sum(), x.sum(), rtol=1e-03, atol=1e-05)
 
 
+@pytest.mark.parametrize('shape', [(2, 10), (2, 10, 4)])
+def test_gather_topk(shape):
+    x = torch.rand(*shape)
+    _, inds = torch.rand(2, 10).topk(3)
+    batch_inds = torch.arange(2).unsqueeze(-1)
+    out = gather_topk(x, inds=inds, batch_size=2)
+    torch.testing.assert_allclose(out, x[batch_inds, inds, ...])
+
+
 config_with_mmdet_params = Config(
     dict(
         codebase_config=dict(